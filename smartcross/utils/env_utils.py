@@ -1,4 +1,5 @@
-from typing import Dict, List
+import functools
+from typing import Dict, List, Tuple
 
 
 def squeeze_obs(obs: Dict) -> List:
@@ -13,12 +14,31 @@ def squeeze_obs(obs: Dict) -> List:
         raise ValueError('Cannot process type: {}, {}'.format(type(obs), obs))
 
 
-def get_suffix_num(input: str) -> List:
-    tmp = input.split('_')
-    res = [int(t) for t in tmp[1:]]
+@functools.lru_cache(maxsize=None)
+def get_suffix_num(input: str) -> Tuple:
+    # road/crossing ids repeat across the parse loops; cache so each id is split only once
+    return tuple(int(t) for t in input.split('_')[1:])
+
+
+def d2md(d: int, radix: int = 4, length: int = 4) -> List:
+    if radix == 4:
+        # branchless shift/mask extraction for the common radix-4 case
+        return [(d >> (2 * (length - 1 - i))) & 3 for i in range(length)]
+    res = []
+    for _ in range(length):
+        res.append(d % radix)
+        d //= radix
+    res.reverse()
     return res
 
 
+def md2d(md: List, radix: int = 4) -> int:
+    d = 0
+    for a in md:
+        d = d * radix + a
+    return d
+
+
 def get_onehot_obs(obs: List, length: int) -> List:
     res = []
     for item in obs:
@@ -0,0 +1,30 @@
+from smartcross.utils.env_utils import d2md, md2d
+
+
+class TestActionConversion:
+
+    def test_roundtrip_radix4(self):
+        for d in range(4 ** 4):
+            md = d2md(d)
+            assert len(md) == 4
+            assert all(0 <= a < 4 for a in md)
+            assert md2d(md) == d
+
+    def test_roundtrip_generic_radix(self):
+        for radix, length in [(2, 5), (3, 3), (5, 2)]:
+            for d in range(radix ** length):
+                md = d2md(d, radix=radix, length=length)
+                assert len(md) == length
+                assert all(0 <= a < radix for a in md)
+                assert md2d(md, radix=radix) == d
+
+    def test_known_values(self):
+        assert d2md(0) == [0, 0, 0, 0]
+        assert d2md(4 ** 4 - 1) == [3, 3, 3, 3]
+        assert d2md(0b01101100) == [1, 2, 3, 0]
+        assert md2d([1, 2, 3, 0]) == 0b01101100
+
+    def test_overflow_truncates_to_low_digits(self):
+        # both radix paths keep only the lowest `length` digits
+        assert d2md(4 ** 4 + 7) == d2md(7)
+        assert d2md(3 ** 3 + 5, radix=3, length=3) == d2md(5, radix=3, length=3)